@@ -1,11 +1,38 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, echo=True)
+# Page bulk INSERTs so a big ingest batch never compiles one monster VALUES list
+engine = create_engine(DATABASE_URL, echo=True, insertmanyvalues_page_size=1000)
+
+if engine.dialect.name == "sqlite":
+    # Dev runs use SQLite; the default rollback journal serializes readers
+    # against the ingest writer, so /arbitrage stalls mid-fetch. WAL + NORMAL
+    # syncing lets reads proceed during writes and speeds inserts up a lot.
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")    # 64MB page cache
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256MB mmap window
+        cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Monotonic version of the odds data as seen by this process. Bumped after
+# every successful ingest commit; caches mix it into their keys so entries
+# go stale the moment new odds land (TTL covers cross-process refreshes).
+data_version = 0
+
+def bump_data_version():
+    global data_version
+    data_version += 1
+
+def get_data_version() -> int:
+    return data_version
@@ -1,12 +1,23 @@
-﻿import os
-import requests
-from typing import List, Dict, Any
+﻿import asyncio
+import os
+import sys
+import httpx
+import ijson
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
-from db import SessionLocal
+from db import SessionLocal, engine, bump_data_version
 import models
 from datetime import datetime
 
+# Pick the UPSERT flavour for the active dialect (Postgres in prod, SQLite in dev)
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert as dialect_insert
+else:
+    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
 # Load API key from .env
 load_dotenv()
 API_KEY = os.getenv("ODDS_API_KEY")
@@ -69,134 +80,227 @@ BASE_PARAMS = {
     "oddsFormat": "decimal"
 }
 
+# Per-sport odds calls are independent; fetch this many at once (stays well
+# under the API's rate limits)
+FETCH_CONCURRENCY = 8
+
+# One pooled connection per in-flight request, kept alive across the batch so
+# every call after the first reuses the same TLS connection to the API host;
+# the transport retries connection-level failures before giving up
+CLIENT_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=16)
+CLIENT_RETRIES = 3
+
 def decimal_to_american(decimal):
-    if decimal >= 2.0:
-        return f"+{int((decimal - 1) * 100)}"
-    else:
-        return f"{int(-100 / (decimal - 1))}"
+    """Decimal price -> American odds string via plain arithmetic on sign/magnitude."""
+    if decimal <= 1.0:
+        # Degenerate price (API glitch); avoid dividing by zero below
+        return "0"
+    sign = 1 if decimal >= 2.0 else -1
+    mag = int(round((decimal - 1.0) * 100.0)) if sign > 0 else int(round(100.0 / (decimal - 1.0)))
+    return f"{'+' if sign > 0 else '-'}{abs(mag)}"
 
 
+# Rows per UPSERT execution; keeps the statement's VALUES list bounded
+UPSERT_CHUNK_SIZE = 1000
+
 def upsert_odds(db: Session, rows: List[Dict[str, Any]]):
-    """Insert or update odds rows in the DB"""
-    for r in rows:
-        existing = db.query(models.Odds).filter_by(
-            sportsbook=r["sportsbook"],
-            league=r["league"],
-            event=r["event"],
-            market=r["market"],
-            outcome=r["outcome"],
-            line=r["line"]
-        ).first()
-
-        if existing:
-            existing.odds_decimal = r["odds_decimal"]
-            existing.odds_american = r["odds_american"]
-            existing.commence_time = r.get("commence_time")
-            existing.event_date = r.get("event_date")
-        else:
-            db.add(models.Odds(**r))
+    """Insert or update odds rows in chunked bulk UPSERTs (no per-row SELECTs)"""
+    if not rows:
+        return
 
+    # Parameterized statement built once; each chunk is an executemany call
+    stmt = dialect_insert(models.Odds)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            "sportsbook", "league", "event", "market", "outcome",
+            text("coalesce(line, -1e9)"),
+        ],
+        set_={
+            "odds_decimal": stmt.excluded.odds_decimal,
+            "odds_american": stmt.excluded.odds_american,
+            "inv_decimal": stmt.excluded.inv_decimal,
+            "commence_time": stmt.excluded.commence_time,
+            "event_date": stmt.excluded.event_date,
+            "last_updated": func.now(),
+        },
+    )
+    # All chunks share one transaction so commit cost is paid once
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        db.execute(stmt, rows[i:i + UPSERT_CHUNK_SIZE])
     db.commit()
+    bump_data_version()
+
+@lru_cache(maxsize=4096)
+def _parse_iso(raw: str) -> Optional[datetime]:
+    """Parse an API timestamp; cached since the same instant repeats across events"""
+    try:
+        return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+def _normalize_event(event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert one API event to DB rows"""
+    rows = []
+    # Books/leagues/markets/outcomes repeat across thousands of rows per
+    # fetch; interning collapses the copies into one object each, so the
+    # batch is lighter and downstream hashing compares by pointer
+    league_guess = sys.intern(
+        (event.get("sport_title", "") or event.get("sport_key", "")).lower()
+    )
+    title = f'{event.get("home_team", "")} vs {event.get("away_team", "")}'
+
+    commence_time_raw = event.get("commence_time")
+    # Parsed once per event (and cached across events sharing a timestamp)
+    commence_time = _parse_iso(commence_time_raw) if commence_time_raw else None
+    event_date = commence_time.date() if commence_time else None  # Date column wants a date object
+
+    for book in event.get("bookmakers", []):
+        sportsbook = book.get("title") or book.get("key")
+        if sportsbook not in ALLOWED_BOOKS:
+            continue
+        sportsbook = sys.intern(sportsbook)
+
+        for m in book.get("markets", []):
+            market_key = sys.intern(m.get("key", "h2h").lower())
+            if "lay" in market_key:
+                continue
+
+            for o in m.get("outcomes", []):
+                try:
+                    odds_val = float(o.get("price", 0))
+                except:
+                    odds_val = 0.0
+
+                try:
+                    line_num = float(o["point"]) if o.get("point") is not None else None
+                except (TypeError, ValueError):
+                    line_num = None
+                american_val = decimal_to_american(odds_val)
+
+                rows.append({
+                    "sportsbook": sportsbook,
+                    "league": league_guess,
+                    "event": title,
+                    "market": market_key,
+                    "outcome": sys.intern(o.get("name", "")),
+                    "line": line_num,
+                    "abs_line": abs(line_num) if line_num is not None else None,
+                    "odds_decimal": odds_val,
+                    "inv_decimal": 1.0 / odds_val if odds_val > 0 else 0.0,
+                    "odds_american": american_val,   # --- store American odds
+                    "commence_time": commence_time,
+                    "event_date": event_date          # --- store event date
+                })
+    return rows
 
 def normalize_payload(payload) -> List[Dict[str, Any]]:
     """Convert API response to DB rows"""
     rows = []
     for event in payload:
-        league_guess = event.get("sport_title", "") or event.get("sport_key", "")
-        title = f'{event.get("home_team", "")} vs {event.get("away_team", "")}'
+        rows.extend(_normalize_event(event))
+    return rows
 
-        commence_time_raw = event.get("commence_time")
-        commence_time = None
-        event_date = None
-        if commence_time_raw:
+class _AsyncByteReader:
+    """Minimal async file-like wrapper so ijson can stream an httpx response"""
+    def __init__(self, aiter):
+        self._aiter = aiter
+        self._buf = b""
+        self._eof = False
+
+    async def read(self, size=-1):
+        if size == 0:
+            return b""
+        while not self._eof and (size < 0 or len(self._buf) < size):
             try:
-                commence_time = datetime.fromisoformat(commence_time_raw.replace("Z", "+00:00"))
-                event_date = commence_time.date().isoformat()  # --- just the date
-            except Exception:
-                pass
-
-        for book in event.get("bookmakers", []):
-            sportsbook = book.get("title") or book.get("key")
-            if sportsbook not in ALLOWED_BOOKS:
-                continue
+                self._buf += await self._aiter.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+        if size < 0:
+            out, self._buf = self._buf, b""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
 
-            for m in book.get("markets", []):
-                market_key = m.get("key", "h2h").lower()
-                if "lay" in market_key:
-                    continue
+async def _ingest_sport(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                        db: Session, sport_key: str) -> int:
+    """
+    Stream one sport's odds response, normalizing events as they arrive and
+    flushing rows to the upsert in chunks - the full payload (1-5MB per
+    sport) is never held in memory. Returns the number of rows saved.
+    """
+    endpoint = f"{BASE}/sports/{sport_key}/odds"
+    async with sem:
+        print(f"Fetching odds for {sport_key}...")
+        async with client.stream("GET", endpoint, params={**BASE_PARAMS, "apiKey": API_KEY}) as resp:
+            if resp.status_code != 200:
+                await resp.aread()
+                try:
+                    msg = resp.json().get("message", resp.text)
+                except Exception:
+                    msg = resp.text
+                print(f"Skipped {sport_key}: HTTP {resp.status_code} - {msg}")
+                return 0
 
-                for o in m.get("outcomes", []):
-                    try:
-                        odds_val = float(o.get("price", 0))
-                    except:
-                        odds_val = 0.0
-
-                    line_val = o.get("point")
-                    american_val = decimal_to_american(odds_val)
-
-                    rows.append({
-                        "sportsbook": sportsbook,
-                        "league": league_guess.lower(),
-                        "event": title,
-                        "market": market_key,
-                        "outcome": o.get("name", ""),
-                        "line": str(line_val) if line_val is not None else None,
-                        "odds_decimal": odds_val,
-                        "odds_american": american_val,   # --- store American odds
-                        "commence_time": commence_time,
-                        "event_date": event_date          # --- store event date
-                    })
-    return rows
+            total = 0
+            rows: List[Dict[str, Any]] = []
+            async for event in ijson.items(_AsyncByteReader(resp.aiter_bytes()), "item"):
+                rows.extend(_normalize_event(event))
+                if len(rows) >= UPSERT_CHUNK_SIZE:
+                    upsert_odds(db, rows)
+                    total += len(rows)
+                    rows = []
+            if rows:
+                upsert_odds(db, rows)
+                total += len(rows)
 
-def main():
+    print(f"Parsed {total} rows for {sport_key}")
+    return total
+
+async def main():
     db = SessionLocal()
     try:
-        sports_resp = requests.get(
-            f"{BASE}/sports/",
-            params={"apiKey": API_KEY},
-            timeout=20
-        )
-        sports_resp.raise_for_status()
-        sports_list = sports_resp.json()
+        async with httpx.AsyncClient(
+            timeout=20,
+            limits=CLIENT_LIMITS,
+            transport=httpx.AsyncHTTPTransport(retries=CLIENT_RETRIES),
+        ) as client:
+            sports_resp = await client.get(f"{BASE}/sports/", params={"apiKey": API_KEY})
+            sports_resp.raise_for_status()
+            sports_list = sports_resp.json()
 
-        print(f"Found {len(sports_list)} sports...")
+            print(f"Found {len(sports_list)} sports...")
 
-        total_rows = 0
-        for sport in sports_list:
-            sport_key = sport["key"]
+            sport_keys = []
+            for sport in sports_list:
+                sport_key = sport["key"]
 
-            if sport_key not in INTERESTED_SPORTS:
-                continue
-            if "_winner" in sport_key:
-                print(f"Skipping {sport_key} (outrights only)")
-                continue
+                if sport_key not in INTERESTED_SPORTS:
+                    continue
+                if "_winner" in sport_key:
+                    print(f"Skipping {sport_key} (outrights only)")
+                    continue
+                sport_keys.append(sport_key)
 
-            endpoint = f"{BASE}/sports/{sport_key}/odds"
-            print(f"Fetching odds for {sport_key}...")
+            # All per-sport calls in flight at once (bounded by the semaphore);
+            # wall time is one round-trip instead of one per sport
+            sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+            results = await asyncio.gather(
+                *[_ingest_sport(client, sem, db, k) for k in sport_keys],
+                return_exceptions=True,
+            )
 
-            try:
-                resp = requests.get(
-                    endpoint,
-                    params={**BASE_PARAMS, "apiKey": API_KEY},
-                    timeout=20
-                )
-                if resp.status_code == 200:
-                    payload = resp.json()
-                    rows = normalize_payload(payload)
-                    print(f"Parsed {len(rows)} rows for {sport_key}")
-                    upsert_odds(db, rows)
-                    total_rows += len(rows)
-                else:
-                    msg = resp.json().get("message", resp.text)
-                    print(f"Skipped {sport_key}: HTTP {resp.status_code} - {msg}")
-            except Exception as e:
-                print(f"Error fetching {sport_key}: {e}")
+        total_rows = 0
+        for sport_key, result in zip(sport_keys, results):
+            if isinstance(result, Exception):
+                print(f"Error fetching {sport_key}: {result}")
+                continue
+            total_rows += result
 
         print(f"Done. Total odds rows saved: {total_rows}")
     finally:
         db.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
 
 
@@ -1,465 +1,643 @@
-# main.py
-from fastapi import FastAPI, Depends, Query
-from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta, timezone
-
-from db import SessionLocal
-import models
-
-app = FastAPI(title="Arbitrage API")
-
-# ---- CORS (dev-friendly) ----
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # during local dev
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# ---- DB dependency ----
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-# ---------- Helpers ----------
-
-def _now_utc() -> datetime:
-    return datetime.now(timezone.utc)
-
-def _iso(dt: Optional[datetime]) -> Optional[str]:
-    if not dt:
-        return None
-    # Return ISO in UTC
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc).isoformat()
-
-def _coerce_line(line_val: Optional[str]) -> Optional[str]:
-    """
-    Normalize line so we can compare like-for-like.
-    Leave None for H2H.
-    For numeric-like strings, keep the original string form to ensure exact match.
-    """
-    if line_val is None:
-        return None
-    s = str(line_val).strip()
-    return s if s else None
-
-def _apply_row_level_filters(
-    rows: List[models.Odds],
-    leagues: Optional[set],
-    markets: Optional[set],
-    sportsbooks: Optional[set],
-    min_hours_ahead: float
-) -> List[models.Odds]:
-    """Filter raw odds rows early, before grouping."""
-    cutoff = _now_utc() + timedelta(hours=min_hours_ahead)
-    out = []
-    for o in rows:
-        # Time filter (exclude live/started or too soon)
-        if o.commence_time is None:
-            # If we don't know the time, skip (safer)
-            continue
-        # Treat naive as UTC if it slipped in
-        ct = o.commence_time if o.commence_time.tzinfo else o.commence_time.replace(tzinfo=timezone.utc)
-        if ct <= cutoff:
-            continue
-
-        if leagues and (o.league or "").lower() not in leagues:
-            continue
-        if markets and (o.market or "").lower() not in markets:
-            continue
-        if sportsbooks and (o.sportsbook or "") not in sportsbooks:
-            continue
-
-        out.append(o)
-    return out
-
-def _group_by_event_market_line(rows: List[models.Odds]) -> Dict[Tuple[str, str, Optional[str]], List[models.Odds]]:
+# main.py
+from fastapi import FastAPI, Depends, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from cachetools import TTLCache
+
+# NumPy is optional: the middle-detection kernels take float arrays, so it
+# only gates the JIT path below.
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without the extras
+    np = None
+
+# Numba is optional too: when present, the middle-detection pair scan runs as
+# a JIT-compiled kernel over float arrays instead of interpreted loops.
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - exercised only without the extras
+    njit = None
+
+from db import SessionLocal, get_data_version
+import models
+
+# orjson serializes the big nested /arbitrage payloads several times faster
+# than the stdlib json encoder
+app = FastAPI(title="Arbitrage API", default_response_class=ORJSONResponse)
+
+# Short-lived cache for /arbitrage results; odds only change on the fetcher
+# cadence, so repeated dashboard polls between refreshes are pure recompute.
+_arb_cache: TTLCache = TTLCache(maxsize=256, ttl=30)
+_arb_cache_lock = Lock()
+
+# Distinct leagues/markets/books only change when new sports are ingested;
+# cache them longer than the arbitrage results.
+_meta_cache: TTLCache = TTLCache(maxsize=8, ttl=300)
+_meta_cache_lock = Lock()
+
+# ---- CORS (dev-friendly) ----
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # during local dev
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# ---- DB dependency ----
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# ---------- Helpers ----------
+
+def _now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    if not dt:
+        return None
+    # Return ISO in UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+# Projected odds row: a named tuple of the columns selected in _query_odds_rows,
+# not a hydrated models.Odds instance (attribute access works the same).
+OddsRow = Any
+
+def _coerce_line(line_val: Optional[float]) -> Optional[str]:
     """
-    Group rows by (event, market, line_key).
-    - H2H: line_key=None
-    - Totals: line_key=exact total points (string normalized)
-    - Spreads: line_key=absolute value of spread (e.g., 2.5 groups +2.5 with -2.5)
+    Serialize a numeric line for grouping keys and responses.
+    Leave None for H2H. '%g' drops trailing zeros so 2.50 and 2.5 match.
+    Tolerates legacy string values from pre-numeric-column rows.
     """
-    from collections import defaultdict
+    if line_val is None:
+        return None
+    try:
+        return "%g" % float(line_val)
+    except (TypeError, ValueError):
+        s = str(line_val).strip()
+        return s if s else None
 
-    def norm_abs_spread(line_val: Optional[str]) -> Optional[str]:
-        if line_val is None:
-            return None
-        try:
-            v = abs(float(str(line_val).strip()))
-            # Canonical format without trailing zeros
-            s = ("%g" % round(v, 3))
-            return s
-        except Exception:
-            # Fallback to raw string if not numeric
-            return _coerce_line(line_val)
-
-    buckets: Dict[Tuple[str, str, Optional[str]], List[models.Odds]] = defaultdict(list)
-    for o in rows:
-        mkt = (o.market or "").lower()
-        if mkt == "spreads":
-            line_key = norm_abs_spread(o.line)
-        elif mkt == "totals":
-            line_key = _coerce_line(o.line)
-        else:
-            line_key = None
-        key = (o.event or "", mkt, line_key)
-        buckets[key].append(o)
-    return buckets
-
-def _best_price_by_outcome(group_rows: List[models.Odds]) -> Dict[str, models.Odds]:
+def _query_odds_rows(
+    db: Session,
+    leagues: Optional[set],
+    markets: Optional[set],
+    sportsbooks: Optional[set],
+    min_hours_ahead: float
+) -> List[OddsRow]:
     """
-    For a group (same event/market/line_key), choose the single best (max) odds per outcome across sportsbooks.
-    Special handling for spreads: collapse outcomes into two sides by sign (plus/minus) at the same absolute line.
+    Fetch pre-filtered odds rows with only the columns we need.
+    Time cutoff and multi-select filters run in SQL so filtered-out rows
+    are never serialized or hydrated; NULL commence_time rows (unknown
+    start) are excluded by the comparison itself.
     """
-    best: Dict[str, models.Odds] = {}
-    if not group_rows:
-        return best
+    cutoff = _now_utc() + timedelta(hours=min_hours_ahead)
+    q = db.query(
+        models.Odds.sportsbook,
+        models.Odds.league,
+        models.Odds.event,
+        models.Odds.market,
+        models.Odds.outcome,
+        models.Odds.line,
+        models.Odds.abs_line,
+        models.Odds.odds_decimal,
+        models.Odds.odds_american,
+        models.Odds.inv_decimal,
+        models.Odds.commence_time,
+        models.Odds.event_date,
+    ).filter(models.Odds.commence_time > cutoff)
 
-    mkt = (group_rows[0].market or "").lower()
-    spreads = (mkt == "spreads")
+    if leagues:
+        q = q.filter(func.lower(models.Odds.league).in_(leagues))
+    if markets:
+        q = q.filter(func.lower(models.Odds.market).in_(markets))
+    if sportsbooks:
+        q = q.filter(models.Odds.sportsbook.in_(sportsbooks))
+    return q.all()
 
-    for o in group_rows:
-        if spreads:
-            side_key = None
-            try:
-                ln = float(str(o.line))
-                side_key = "plus" if ln >= 0 else "minus"
-            except Exception:
-                # If we can't parse, fall back to outcome string
-                side_key = o.outcome or ""
-            outcome_key = side_key
-        else:
-            outcome_key = o.outcome or ""
+# Numeric stand-in for "no line" (h2h) in SQL grouping - NULLs don't compare
+# equal, and no real line comes close to this value (mirrors the upsert index)
+_NO_LINE = -1e9
+
+def _collect_books_summary(rows: List[OddsRow]) -> Dict[str, Any]:
+    """
+    Tiny helper for a heatmap/summary: how often each book offers the best price in its group.
+    We compute on a 'per (event, market, line, outcome)' basis.
+    """
+    summary: Dict[str, Dict[str, float]] = {}
 
-        prev = best.get(outcome_key)
+    # Single pass: track the running best row per (event, market, line,
+    # outcome) and the per-book sums as we go - no bucket lists materialized.
+    best_by_emo: Dict[Tuple[str, str, Optional[str], str], OddsRow] = {}
+    avg_odds_sum: Dict[str, float] = {}
+    avg_odds_n: Dict[str, int] = {}
+
+    for o in rows:
+        key = (o.event or "", (o.market or "").lower(), _coerce_line(o.line), (o.outcome or ""))
+        prev = best_by_emo.get(key)
         if prev is None or (o.odds_decimal or 0.0) > (prev.odds_decimal or 0.0):
-            best[outcome_key] = o
-    return best
-
-def _calc_arb_margin(best_by_outcome: Dict[str, models.Odds]) -> float:
-    """
-    Return margin as a percent (e.g., 1.23 for 1.23%).
-    Arbitrage when inverse-sum < 1
-    """
-    inv_sum = 0.0
-    for o in best_by_outcome.values():
-        odd = float(o.odds_decimal or 0.0)
-        if odd <= 0:
-            return 0.0
-        inv_sum += 1.0 / odd
-    if inv_sum < 1.0:
-        return (1.0 - inv_sum) * 100.0
-    return 0.0
-
-def _collect_books_summary(rows: List[models.Odds]) -> Dict[str, Any]:
-    """
-    Tiny helper for a heatmap/summary: how often each book offers the best price in its group.
-    We compute on a 'per (event, market, line, outcome)' basis.
-    """
-    summary: Dict[str, Dict[str, float]] = {}
-    # group by (event, market, line, outcome)
-    from collections import defaultdict
-    by_emo: Dict[Tuple[str, str, Optional[str], str], List[models.Odds]] = defaultdict(list)
-    for o in rows:
-        by_emo[(o.event or "", (o.market or "").lower(), _coerce_line(o.line), (o.outcome or ""))].append(o)
-
-    best_counts: Dict[str, int] = {}
-    avg_odds_sum: Dict[str, float] = {}
-    avg_odds_n: Dict[str, int] = {}
-
-    for _, lst in by_emo.items():
-        # find the single best
-        best = None
-        for o in lst:
-            if best is None or (o.odds_decimal or 0.0) > (best.odds_decimal or 0.0):
-                best = o
-        if best and best.sportsbook:
-            best_counts[best.sportsbook] = best_counts.get(best.sportsbook, 0) + 1
-
-        # accumulate average odds per book
-        for o in lst:
-            if not o.sportsbook:
-                continue
-            avg_odds_sum[o.sportsbook] = avg_odds_sum.get(o.sportsbook, 0.0) + float(o.odds_decimal or 0.0)
-            avg_odds_n[o.sportsbook] = avg_odds_n.get(o.sportsbook, 0) + 1
-
-    books = set(list(best_counts.keys()) + list(avg_odds_sum.keys()))
-    for b in books:
-        summary[b] = {
-            "best_price_count": best_counts.get(b, 0),
-            "avg_offered_decimal": (avg_odds_sum[b] / avg_odds_n[b]) if avg_odds_n.get(b) else None,
-        }
-    return summary
-
+            best_by_emo[key] = o
+
+        if not o.sportsbook:
+            continue
+        avg_odds_sum[o.sportsbook] = avg_odds_sum.get(o.sportsbook, 0.0) + float(o.odds_decimal or 0.0)
+        avg_odds_n[o.sportsbook] = avg_odds_n.get(o.sportsbook, 0) + 1
+
+    best_counts: Dict[str, int] = {}
+    for best in best_by_emo.values():
+        if best.sportsbook:
+            best_counts[best.sportsbook] = best_counts.get(best.sportsbook, 0) + 1
+
+    books = set(list(best_counts.keys()) + list(avg_odds_sum.keys()))
+    for b in books:
+        summary[b] = {
+            "best_price_count": best_counts.get(b, 0),
+            "avg_offered_decimal": (avg_odds_sum[b] / avg_odds_n[b]) if avg_odds_n.get(b) else None,
+        }
+    return summary
+
+def _sql_opportunities(
+    db: Session,
+    leagues_set: Optional[set],
+    markets_set: Optional[set],
+    books_set: Optional[set],
+    min_margin: float,
+    min_hours_ahead: float,
+) -> List[Dict[str, Any]]:
+    """
+    Compute arbitrage opportunities entirely in SQL.
+    ROW_NUMBER() picks the best price per (event, market, line_key, outcome),
+    a GROUP BY sums reciprocals per group, and HAVING applies the margin
+    filter - only winning rows ever cross into Python.
+    """
+    cutoff = _now_utc() + timedelta(hours=min_hours_ahead)
+    O = models.Odds
+
+    market_l = func.lower(O.market)
+    # Numeric group line: abs spread / exact total / sentinel for h2h
+    line_key = case(
+        (market_l == "spreads", func.coalesce(O.abs_line, func.abs(O.line), _NO_LINE)),
+        (market_l == "totals", func.coalesce(O.line, _NO_LINE)),
+        else_=_NO_LINE,
+    )
+    # Spreads collapse to plus/minus sides at the same abs line
+    outcome_key = case(
+        (and_(market_l == "spreads", O.line.isnot(None)),
+         case((O.line >= 0, "plus"), else_="minus")),
+        else_=func.coalesce(O.outcome, ""),
+    )
+    # Reciprocal odds, falling back to division for pre-inv_decimal rows
+    inv = case(
+        (O.inv_decimal.isnot(None), O.inv_decimal),
+        (O.odds_decimal > 0, 1.0 / O.odds_decimal),
+        else_=0.0,
+    )
+
+    conds = [O.commence_time > cutoff]
+    if leagues_set:
+        conds.append(func.lower(O.league).in_(leagues_set))
+    if markets_set:
+        conds.append(market_l.in_(markets_set))
+    if books_set:
+        conds.append(O.sportsbook.in_(books_set))
+
+    ranked = (
+        select(
+            func.coalesce(O.event, "").label("event"),
+            market_l.label("market"),
+            line_key.label("line_key"),
+            outcome_key.label("outcome_key"),
+            O.sportsbook.label("sportsbook"),
+            O.line.label("line"),
+            O.odds_decimal.label("odds_decimal"),
+            O.odds_american.label("odds_american"),
+            inv.label("inv"),
+            O.league.label("league"),
+            O.commence_time.label("commence_time"),
+            O.event_date.label("event_date"),
+            func.row_number().over(
+                partition_by=[func.coalesce(O.event, ""), market_l, line_key, outcome_key],
+                order_by=O.odds_decimal.desc(),
+            ).label("rn"),
+        )
+        .where(and_(*conds))
+        .cte("ranked")
+    )
+
+    best = select(ranked).where(ranked.c.rn == 1).cte("best")
+
+    # Groups in arbitrage: >=2 outcomes, all prices valid, reciprocals sum
+    # below 1 with at least min_margin percent of headroom
+    arbs = (
+        select(
+            best.c.event,
+            best.c.market,
+            best.c.line_key,
+            func.sum(best.c.inv).label("inv_sum"),
+        )
+        .group_by(best.c.event, best.c.market, best.c.line_key)
+        .having(func.count() >= 2)
+        .having(func.min(best.c.inv) > 0)
+        .having(func.sum(best.c.inv) < 1.0)
+        .having(func.sum(best.c.inv) <= 1.0 - min_margin / 100.0)
+        .cte("arbs")
+    )
+
+    joined = best.join(arbs, and_(
+        best.c.event == arbs.c.event,
+        best.c.market == arbs.c.market,
+        best.c.line_key == arbs.c.line_key,
+    ))
+    stmt = (
+        select(best, arbs.c.inv_sum)
+        .select_from(joined)
+        .order_by(best.c.event, best.c.market, best.c.line_key)
+    )
+
+    # Groups arrive contiguously thanks to the ORDER BY; fold each into one
+    # opportunity dict
+    opportunities: List[Dict[str, Any]] = []
+    current_key = None
+    for row in db.execute(stmt):
+        key = (row.event, row.market, row.line_key)
+        if key != current_key:
+            current_key = key
+            opportunities.append({
+                "event": row.event,
+                "league": (row.league or "").lower(),
+                "market": row.market,
+                "line": None if row.line_key == _NO_LINE else ("%g" % row.line_key),
+                "commence_time": _iso(row.commence_time),
+                "event_date": row.event_date,
+                "profit_margin": round((1.0 - row.inv_sum) * 100.0, 3),
+                "best_odds": [],
+            })
+        opportunities[-1]["best_odds"].append({
+            "sportsbook": row.sportsbook,
+            "outcome": row.outcome_key,
+            "odds_decimal": float(row.odds_decimal or 0.0),
+            "odds_american": row.odds_american,
+            "line": _coerce_line(row.line),
+        })
+
+    return opportunities
+
+
+def _find_middle_pairs_py(over_lines, over_prices, under_lines, under_prices,
+                          min_width: float, min_price: float) -> List[Tuple[int, int]]:
+    """
+    Index pairs (i, j) where Over at line i and Under at line j leave a gap of
+    at least min_width with both prices at or above min_price.
+    """
+    pairs: List[Tuple[int, int]] = []
+    for i in range(len(over_lines)):
+        if over_prices[i] < min_price:
+            continue
+        for j in range(len(under_lines)):
+            if under_lines[j] <= over_lines[i]:
+                continue
+            if under_prices[j] < min_price:
+                continue
+            if under_lines[j] - over_lines[i] < min_width:
+                continue
+            pairs.append((i, j))
+    return pairs
+
+if njit is not None and np is not None:
+    # Same scan as _find_middle_pairs_py, compiled over float64 arrays
+    @njit(cache=True)
+    def _find_middle_pairs_jit(over_lines, over_prices, under_lines, under_prices,
+                               min_width, min_price):  # pragma: no cover - compiled
+        out = np.empty((over_lines.shape[0] * under_lines.shape[0], 2), dtype=np.int64)
+        k = 0
+        for i in range(over_lines.shape[0]):
+            if over_prices[i] < min_price:
+                continue
+            for j in range(under_lines.shape[0]):
+                if under_lines[j] <= over_lines[i]:
+                    continue
+                if under_prices[j] < min_price:
+                    continue
+                if under_lines[j] - over_lines[i] < min_width:
+                    continue
+                out[k, 0] = i
+                out[k, 1] = j
+                k += 1
+        return out[:k]
+else:
+    _find_middle_pairs_jit = None
+
 def _detect_middles_totals(
-    rows: List[models.Odds],
+    rows: List[OddsRow],
     min_width: float = 0.5,
     min_price: float = 1.87,
 ) -> List[Dict[str, Any]]:
-    """
-    Conservative, totals-only middles:
-      - For a given event, look at totals market.
-      - If Over line at book A is strictly less than Under line at book B, that's a 'gap' (potential middle).
-      - Require both prices >= 1.87 (~ -115) to avoid trash.
-    NOTE: This is not guaranteed profit; it's just a candidate where a 'middle' can occur.
-    """
-    candidates: List[Dict[str, Any]] = []
-    # Group by event
-    from collections import defaultdict
-    by_event: Dict[str, List[models.Odds]] = defaultdict(list)
-    for o in rows:
-        if (o.market or "").lower() != "totals":
-            continue
-        by_event[o.event or ""].append(o)
-
-    for event, lst in by_event.items():
-        # Partition by outcome
-        overs = [o for o in lst if (o.outcome or "").lower().startswith("over")]
-        unders = [o for o in lst if (o.outcome or "").lower().startswith("under")]
-        if not overs or not unders:
-            continue
-
-        # Parse numeric lines; skip non-numeric
-        def read_line(x: models.Odds) -> Optional[float]:
-            try:
-                return float(str(x.line))
-            except Exception:
-                return None
-
-        # Build per-book best Over (max odds) per distinct line and same for Under
-        from collections import defaultdict
-        best_over_by_line: Dict[float, models.Odds] = {}
-        best_under_by_line: Dict[float, models.Odds] = {}
-
-        for o in overs:
-            l = read_line(o)
-            if l is None:
-                continue
-            prev = best_over_by_line.get(l)
-            if prev is None or (o.odds_decimal or 0.0) > (prev.odds_decimal or 0.0):
-                best_over_by_line[l] = o
-        for u in unders:
-            l = read_line(u)
-            if l is None:
-                continue
-            prev = best_under_by_line.get(l)
-            if prev is None or (u.odds_decimal or 0.0) > (prev.odds_decimal or 0.0):
-                best_under_by_line[l] = u
-
-        if not best_over_by_line or not best_under_by_line:
-            continue
-
-        # Try pairs: Over at lower total, Under at higher total
-        over_lines = sorted(best_over_by_line.keys())
-        under_lines = sorted(best_under_by_line.keys())
-
-        for lo in over_lines:
-            over_row = best_over_by_line[lo]
-            over_price = float(over_row.odds_decimal or 0.0)
-            if over_price < float(min_price):
+    """
+    Conservative, totals-only middles:
+      - For a given event, look at totals market.
+      - If Over line at book A is strictly less than Under line at book B, that's a 'gap' (potential middle).
+      - Require both prices >= 1.87 (~ -115) to avoid trash.
+    NOTE: This is not guaranteed profit; it's just a candidate where a 'middle' can occur.
+    """
+    candidates: List[Dict[str, Any]] = []
+    # Group by event
+    from collections import defaultdict
+    by_event: Dict[str, List[OddsRow]] = defaultdict(list)
+    for o in rows:
+        if (o.market or "").lower() != "totals":
+            continue
+        by_event[o.event or ""].append(o)
+
+    for event, lst in by_event.items():
+        # Partition by outcome
+        overs = [o for o in lst if (o.outcome or "").lower().startswith("over")]
+        unders = [o for o in lst if (o.outcome or "").lower().startswith("under")]
+        if not overs or not unders:
+            continue
+
+        # Lines are numeric now; guard for None / legacy string rows
+        def read_line(x: OddsRow) -> Optional[float]:
+            try:
+                return float(x.line)
+            except (TypeError, ValueError):
+                return None
+
+        # Build per-book best Over (max odds) per distinct line and same for Under
+        from collections import defaultdict
+        best_over_by_line: Dict[float, OddsRow] = {}
+        best_under_by_line: Dict[float, OddsRow] = {}
+
+        for o in overs:
+            l = read_line(o)
+            if l is None:
                 continue
-            for lu in under_lines:
-                if lu <= lo:
-                    continue
-                under_row = best_under_by_line[lu]
-                under_price = float(under_row.odds_decimal or 0.0)
-                if under_price < float(min_price):
-                    continue
+            prev = best_over_by_line.get(l)
+            if prev is None or (o.odds_decimal or 0.0) > (prev.odds_decimal or 0.0):
+                best_over_by_line[l] = o
+        for u in unders:
+            l = read_line(u)
+            if l is None:
+                continue
+            prev = best_under_by_line.get(l)
+            if prev is None or (u.odds_decimal or 0.0) > (prev.odds_decimal or 0.0):
+                best_under_by_line[l] = u
+
+        if not best_over_by_line or not best_under_by_line:
+            continue
+
+        # Try pairs: Over at lower total, Under at higher total
+        over_lines = sorted(best_over_by_line.keys())
+        under_lines = sorted(best_under_by_line.keys())
+        over_prices = [float(best_over_by_line[l].odds_decimal or 0.0) for l in over_lines]
+        under_prices = [float(best_under_by_line[l].odds_decimal or 0.0) for l in under_lines]
+
+        if _find_middle_pairs_jit is not None:
+            pairs = _find_middle_pairs_jit(
+                np.asarray(over_lines, dtype=np.float64),
+                np.asarray(over_prices, dtype=np.float64),
+                np.asarray(under_lines, dtype=np.float64),
+                np.asarray(under_prices, dtype=np.float64),
+                float(min_width), float(min_price),
+            )
+        else:
+            pairs = _find_middle_pairs_py(
+                over_lines, over_prices, under_lines, under_prices,
+                float(min_width), float(min_price),
+            )
+
+        # Reconstruct candidate dicts only for the winning pairs
+        for i, j in pairs:
+            lo = over_lines[i]
+            lu = under_lines[j]
+            over_row = best_over_by_line[lo]
+            under_row = best_under_by_line[lu]
+            ct = over_row.commence_time or under_row.commence_time
+            candidates.append({
+                "event": event,
+                "market": "totals",
+                "over": {
+                    "sportsbook": over_row.sportsbook,
+                    "line": str(lo),
+                    "odds_decimal": over_row.odds_decimal,
+                    "odds_american": over_row.odds_american,
+                },
+                "under": {
+                    "sportsbook": under_row.sportsbook,
+                    "line": str(lu),
+                    "odds_decimal": under_row.odds_decimal,
+                    "odds_american": under_row.odds_american,
+                },
+                "middle_width": lu - lo,
+                "commence_time": _iso(ct),
+                "event_date": getattr(over_row, "event_date", None) or getattr(under_row, "event_date", None),
+                "note": "Totals middle candidate (not guaranteed profit).",
+            })
+    return candidates
+
+
+# ---------- Endpoints ----------
+
+@app.on_event("startup")
+def _warm_jit_kernels():
+    # Pay the one-off Numba compile cost at startup, not on the first request
+    if _find_middle_pairs_jit is not None:
+        dummy = np.zeros(1, dtype=np.float64)
+        _find_middle_pairs_jit(dummy, dummy, dummy, dummy, 0.5, 1.87)
+
+@app.get("/health")
+def health():
+    return {"ok": True, "time": _iso(_now_utc())}
+
+def _cached_distinct(db: Session, name: str, column, lower: bool) -> List[str]:
+    """SELECT DISTINCT on an indexed column, cached per data version."""
+    key = (name, get_data_version())
+    with _meta_cache_lock:
+        vals = _meta_cache.get(key)
+    if vals is None:
+        q = db.query(column).distinct().all()
+        if lower:
+            vals = sorted({(row[0] or "").lower() for row in q if row[0]})
+        else:
+            vals = sorted({row[0] for row in q if row[0]})
+        with _meta_cache_lock:
+            _meta_cache[key] = vals
+    return vals
+
+@app.get("/leagues")
+def list_leagues(db: Session = Depends(get_db)):
+    return {"leagues": _cached_distinct(db, "leagues", models.Odds.league, lower=True)}
+
+@app.get("/markets")
+def list_markets(db: Session = Depends(get_db)):
+    return {"markets": _cached_distinct(db, "markets", models.Odds.market, lower=True)}
+
+@app.get("/books")
+def list_books(db: Session = Depends(get_db)):
+    return {"sportsbooks": _cached_distinct(db, "books", models.Odds.sportsbook, lower=False)}
+
 
-                width = lu - lo
-                if width < float(min_width):  # require minimum gap
-                    continue
-
-                # Candidate
-                ct = over_row.commence_time or under_row.commence_time
-                candidates.append({
-                    "event": event,
-                    "market": "totals",
-                    "over": {
-                        "sportsbook": over_row.sportsbook,
-                        "line": str(lo),
-                        "odds_decimal": over_row.odds_decimal,
-                        "odds_american": over_row.odds_american,
-                    },
-                    "under": {
-                        "sportsbook": under_row.sportsbook,
-                        "line": str(lu),
-                        "odds_decimal": under_row.odds_decimal,
-                        "odds_american": under_row.odds_american,
-                    },
-                    "middle_width": width,
-                    "commence_time": _iso(ct),
-                    "event_date": getattr(over_row, "event_date", None) or getattr(under_row, "event_date", None),
-                    "note": "Totals middle candidate (not guaranteed profit).",
-                })
-    return candidates
-
-
-# ---------- Endpoints ----------
-
-@app.get("/health")
-def health():
-    return {"ok": True, "time": _iso(_now_utc())}
-
-@app.get("/leagues")
-def list_leagues(db: Session = Depends(get_db)):
-    q = db.query(models.Odds.league).distinct().all()
-    leagues = sorted({(row[0] or "").lower() for row in q if row[0]})
-    return {"leagues": leagues}
-
-@app.get("/markets")
-def list_markets(db: Session = Depends(get_db)):
-    q = db.query(models.Odds.market).distinct().all()
-    markets = sorted({(row[0] or "").lower() for row in q if row[0]})
-    return {"markets": markets}
-
-@app.get("/books")
-def list_books(db: Session = Depends(get_db)):
-    q = db.query(models.Odds.sportsbook).distinct().all()
-    books = sorted({row[0] for row in q if row[0]})
-    return {"sportsbooks": books}
-
-
 @app.get("/arbitrage")
 def get_arbitrage(
-    db: Session = Depends(get_db),
-    leagues: Optional[str] = Query(None, description="Comma-separated league keys (lowercase)"),
-    markets: Optional[str] = Query(None, description="Comma-separated markets, e.g. h2h,spreads,totals"),
-    sportsbooks: Optional[str] = Query(None, description="Comma-separated sportsbook titles to include"),
-    min_margin: float = Query(0.0, description="Minimum arbitrage margin in percent (e.g. 1.0 for 1%)"),
-    min_hours_ahead: float = Query(0.0, alias="time", description="Exclude games starting before X hours from now"),
+    db: Session = Depends(get_db),
+    leagues: Optional[str] = Query(None, description="Comma-separated league keys (lowercase)"),
+    markets: Optional[str] = Query(None, description="Comma-separated markets, e.g. h2h,spreads,totals"),
+    sportsbooks: Optional[str] = Query(None, description="Comma-separated sportsbook titles to include"),
+    min_margin: float = Query(0.0, description="Minimum arbitrage margin in percent (e.g. 1.0 for 1%)"),
+    min_hours_ahead: float = Query(0.0, alias="time", description="Exclude games starting before X hours from now"),
     show_middles: bool = Query(False, description="Include totals 'middle' candidates"),
     middle_min_width: float = Query(0.5, description="Minimum gap between Over and Under totals for middle"),
     middle_min_price: float = Query(1.87, description="Minimum decimal price for Over/Under in middle"),
-    sort_by: str = Query("profit", description="profit|date|league|event"),
-    sort_dir: str = Query("desc", description="asc|desc"),
-    page: int = Query(1, ge=1),
-    limit: int = Query(50, ge=1, le=500),
-):
-    """
-    Find arbitrage opportunities with filters & sorting.
-    - Requires same exact line for spreads/totals; H2H has no line.
-    - Excludes games starting before `min_hours_ahead`.
-    - Returns pagination + optional middles (+ a small books summary).
-
-    NOTES:
-    - min_margin is in PERCENT.
-    - leagues/markets/sportsbooks accept comma-separated values.
-    """
-
-    # Parse multi-select filters
-    leagues_set = {s.strip().lower() for s in leagues.split(",")} if leagues else None
-    markets_set = {s.strip().lower() for s in markets.split(",")} if markets else None
-    books_set = {s.strip() for s in sportsbooks.split(",")} if sportsbooks else None
-
-    # Load and pre-filter rows
-    rows = db.query(models.Odds).all()
-    rows = _apply_row_level_filters(rows, leagues_set, markets_set, books_set, min_hours_ahead)
-
-    # Books summary for heatmap/analytics
-    books_summary = _collect_books_summary(rows)
-
-    # Group and compute arbs
-    groups = _group_by_event_market_line(rows)
-    opportunities: List[Dict[str, Any]] = []
-
-    for (event, market, line_norm), group_rows in groups.items():
-        # Collate best price per outcome
-        best_by_outcome = _best_price_by_outcome(group_rows)
-
-        # If there's only one outcome, skip
-        if len(best_by_outcome) < 2:
-            continue
-
-        # Require same line within group (already enforced by grouping key)
-        # Compute margin
-        margin = _calc_arb_margin(best_by_outcome)
-        if margin <= 0 or margin < float(min_margin):
-            continue
-
-        # Pick a commence_time & league from any row (they're same event)
-        sample = group_rows[0]
-        ct = sample.commence_time
-        league_val = (sample.league or "").lower()
-        event_date = getattr(sample, "event_date", None)
-
-        # Build best-odds payload
-        best_list = []
-        for outc, row in best_by_outcome.items():
-            best_list.append({
-                "sportsbook": row.sportsbook,
-                "outcome": outc,
-                "odds_decimal": float(row.odds_decimal or 0.0),
-                "odds_american": row.odds_american,
-                "line": _coerce_line(row.line),
-            })
-
-        opportunities.append({
-            "event": event,
-            "league": league_val,
-            "market": market,
-            "line": line_norm,  # None for h2h
-            "commence_time": _iso(ct),
-            "event_date": event_date,
-            "profit_margin": round(margin, 3),
-            "best_odds": best_list,
-        })
-
-    # Sorting
-    reverse = (sort_dir.lower() == "desc")
-
-    def sort_key(item: Dict[str, Any]):
-        if sort_by == "date":
-            return item.get("commence_time") or ""
-        if sort_by == "league":
-            return item.get("league") or ""
-        if sort_by == "event":
-            return item.get("event") or ""
-        # default: profit
-        return item.get("profit_margin", 0.0)
-
-    opportunities.sort(key=sort_key, reverse=reverse)
-
-    # Pagination
-    total = len(opportunities)
-    start = (page - 1) * limit
-    end = start + limit
-    opportunities_page = opportunities[start:end]
-
-    # Optional middles (totals-only)
-    middles: List[Dict[str, Any]] = []
-    if show_middles:
-        middles = _detect_middles_totals(rows, min_width=middle_min_width, min_price=middle_min_price)
-        # sort middles by width descending, then date
-        middles.sort(key=lambda x: (x.get("middle_width", 0.0), x.get("commence_time", "")), reverse=True)
-
-    return {
+    include_books_summary: bool = Query(False, description="Include the per-book best-price summary (extra pass)"),
+    sort_by: str = Query("profit", description="profit|date|league|event"),
+    sort_dir: str = Query("desc", description="asc|desc"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Find arbitrage opportunities with filters & sorting.
+    - Requires same exact line for spreads/totals; H2H has no line.
+    - Excludes games starting before `min_hours_ahead`.
+    - Returns pagination + optional middles (+ a small books summary).
+
+    NOTES:
+    - min_margin is in PERCENT.
+    - leagues/markets/sportsbooks accept comma-separated values.
+    """
+
+    # Parse multi-select filters
+    leagues_set = {s.strip().lower() for s in leagues.split(",")} if leagues else None
+    markets_set = {s.strip().lower() for s in markets.split(",")} if markets else None
+    books_set = {s.strip() for s in sportsbooks.split(",")} if sportsbooks else None
+
+    # Everything except pagination is a pure function of the DB snapshot +
+    # params, so serve repeat polls from the TTL cache. data_version makes
+    # entries stale as soon as this process ingests new odds.
+    cache_key = (
+        get_data_version(),
+        tuple(sorted(leagues_set)) if leagues_set else None,
+        tuple(sorted(markets_set)) if markets_set else None,
+        tuple(sorted(books_set)) if books_set else None,
+        float(min_margin),
+        float(min_hours_ahead),
+        show_middles,
+        float(middle_min_width),
+        float(middle_min_price),
+        include_books_summary,
+        sort_by,
+        sort_dir.lower(),
+    )
+    with _arb_cache_lock:
+        computed = _arb_cache.get(cache_key)
+    if computed is None:
+        computed = _compute_arbitrage(
+            db, leagues_set, markets_set, books_set,
+            min_margin, min_hours_ahead,
+            show_middles, middle_min_width, middle_min_price,
+            include_books_summary, sort_by, sort_dir,
+        )
+        with _arb_cache_lock:
+            _arb_cache[cache_key] = computed
+
+    opportunities = computed["opportunities"]
+    middles = computed["middles"]
+    books_summary = computed["books_summary"]
+
+    # Pagination (post-cache, on the already-sorted list)
+    total = len(opportunities)
+    start = (page - 1) * limit
+    end = start + limit
+    opportunities_page = opportunities[start:end]
+
+    return {
         "filters": {
-            "leagues": sorted(list(leagues_set)) if leagues_set else None,
-            "markets": sorted(list(markets_set)) if markets_set else None,
-            "sportsbooks": sorted(list(books_set)) if books_set else None,
-            "min_margin": float(min_margin),
+            "leagues": sorted(list(leagues_set)) if leagues_set else None,
+            "markets": sorted(list(markets_set)) if markets_set else None,
+            "sportsbooks": sorted(list(books_set)) if books_set else None,
+            "min_margin": float(min_margin),
             "min_hours_ahead": float(min_hours_ahead),
             "show_middles": show_middles,
             "middle_min_width": float(middle_min_width),
             "middle_min_price": float(middle_min_price),
         },
-        "sort": {"by": sort_by, "dir": sort_dir},
-        "page": page,
-        "limit": limit,
-        "total": total,
-        "opportunities": opportunities_page,
-        "middles": middles,
-        "books_summary": books_summary,
-        "generated_at": _iso(_now_utc()),
-    }
+        "sort": {"by": sort_by, "dir": sort_dir},
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "opportunities": opportunities_page,
+        "middles": middles,
+        "books_summary": books_summary,
+        "generated_at": _iso(_now_utc()),
+    }
+
+
+def _compute_arbitrage(
+    db: Session,
+    leagues_set: Optional[set],
+    markets_set: Optional[set],
+    books_set: Optional[set],
+    min_margin: float,
+    min_hours_ahead: float,
+    show_middles: bool,
+    middle_min_width: float,
+    middle_min_price: float,
+    include_books_summary: bool,
+    sort_by: str,
+    sort_dir: str,
+) -> Dict[str, Any]:
+    """Run the full (cacheable) arbitrage pipeline: fetch, group, sort."""
+
+    # Raw rows are only needed for the opt-in extras (middles scan, books
+    # summary); the core arb pipeline never materializes them
+    rows = (
+        _query_odds_rows(db, leagues_set, markets_set, books_set, min_hours_ahead)
+        if (show_middles or include_books_summary)
+        else []
+    )
+
+    # Books summary for heatmap/analytics - opt-in, it's a full extra pass
+    books_summary = _collect_books_summary(rows) if include_books_summary else {}
+
+    # Group and compute arbs in the database (window function + HAVING)
+    opportunities = _sql_opportunities(
+        db, leagues_set, markets_set, books_set, float(min_margin), min_hours_ahead
+    )
+
+    # Sorting
+    reverse = (sort_dir.lower() == "desc")
+
+    def sort_key(item: Dict[str, Any]):
+        if sort_by == "date":
+            return item.get("commence_time") or ""
+        if sort_by == "league":
+            return item.get("league") or ""
+        if sort_by == "event":
+            return item.get("event") or ""
+        # default: profit
+        return item.get("profit_margin", 0.0)
+
+    opportunities.sort(key=sort_key, reverse=reverse)
+
+    # Optional middles (totals-only)
+    middles: List[Dict[str, Any]] = []
+    if show_middles:
+        middles = _detect_middles_totals(rows, min_width=middle_min_width, min_price=middle_min_price)
+        # sort middles by width descending, then date
+        middles.sort(key=lambda x: (x.get("middle_width", 0.0), x.get("commence_time", "")), reverse=True)
+
+    return {
+        "opportunities": opportunities,
+        "middles": middles,
+        "books_summary": books_summary,
+    }
@@ -1,24 +1,41 @@
-﻿from sqlalchemy import Column, Integer, String, Float, DateTime, Date
+﻿from sqlalchemy import Column, Integer, String, Float, DateTime, Date, FetchedValue, Index, func, text
 from db import Base
-from datetime import datetime, timezone
 
 class Odds(Base):
     __tablename__ = "odds"
 
+    # One row per (book, league, event, market, outcome, line).
+    # NULL lines (h2h) collapse to a sentinel so the upsert conflict target
+    # matches them too (no real line comes close to -1e9).
+    __table_args__ = (
+        Index(
+            "uq_odds_identity",
+            "sportsbook", "league", "event", "market", "outcome",
+            text("coalesce(line, -1e9)"),
+            unique=True,
+        ),
+        # Serves the /arbitrage scan: time cutoff + league/market filters
+        Index("ix_odds_commence_league_market", "commence_time", "league", "market"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     sportsbook = Column(String, index=True)
-    league = Column(String)
+    league = Column(String, index=True)
     event = Column(String, index=True)
-    market = Column(String)
+    market = Column(String, index=True)
     outcome = Column(String)
-    line = Column(String, nullable=True)  
+    line = Column(Float, nullable=True)  # numeric; None for h2h
+    abs_line = Column(Float, nullable=True, index=True)  # |line|, groups +2.5 with -2.5
     odds_decimal = Column(Float)
-    odds_american = Column(String, nullable=True)  # American odds (e.g., +200 / -110)
+    odds_american = Column(String, nullable=True)  # American odds (e.g., +200 / -110)
+    inv_decimal = Column(Float, nullable=True)  # 1/odds_decimal, precomputed at ingest
     event_date = Column(Date, nullable=True)
+    # Stamped by the database, not per-row Python callbacks - the bulk upsert
+    # sets it in its conflict clause, so ORM onupdate hooks would be dead weight
     last_updated = Column(
-        DateTime,   
-        default=lambda: datetime.now(timezone.utc),
-        onupdate=lambda: datetime.now(timezone.utc)
+        DateTime,
+        server_default=func.now(),
+        server_onupdate=FetchedValue(),
     )
     commence_time = Column(DateTime, nullable=True)
 